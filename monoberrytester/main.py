@@ -18,8 +18,11 @@ TODO: Put logs somewhere else because /tmp get wiped on reboot
 
 import sys
 
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
+from PyQt5.QtGui import QTextCursor
 from PyQt5.QtWidgets import QApplication, QMainWindow
 
+import styles
 import texts
 from ui import UI
 from workflow import State, Workflow
@@ -59,36 +62,49 @@ class Main(QMainWindow):
                                     self.process_controller
                                 )
 
+        # Buffer for coalescing log appends into one log-widget relayout
+        self.pending_log_lines = []
+        self.log_flush_scheduled = False
+
+        # logline_received is also emitted from worker threads (e.g.
+        # ServerClient logging a failure), so it must stay on
+        # AutoConnection to be queued back to the GUI thread; the
+        # workflow signals below are emitted on the GUI thread only and
+        # can skip the affinity check
         self.logger.logline_received.connect(self.__update_logs_ui)
         self.ui.start_btn.clicked.connect(self.workflow.start)
         self.ui.reset_btn.clicked.connect(self.workflow.reset)
-        self.workflow.code_scanned.connect(self.__update_scanned_codes)
-        self.workflow.serial_scanned.connect(self.__update_serial)
-        self.workflow.state_changed.connect(self.__update_ui)
-        self.workflow.test_state_changed.connect(self.__update_test_ui)
-
-        self.state_handlers = {
-            State.IDLE:                     self.__update_ui_idle,
-            State.STARTED:                  self.__update_ui_started,
-            State.CONNECTING_TO_UART:       self.__update_ui_connecting_to_uart,
-            State.SCANNING_SERIAL_NUM:      self.__update_ui_scanning_serial_num,
-            State.SCANNING_QR_CODES:        self.__update_ui_scanning_qr_codes,
-            State.REGISTERING_DEVICE:       self.__update_ui_register_device,
-            State.LOADING_UBOOT_VIA_JTAG:   self.__update_ui_loading_uboot_via_jtag,
-            State.WAITING_FOR_UBOOT:        self.__update_ui_waiting_for_uboot,
-            State.DONE:                     self.__update_ui_done,
-            State.FAILED:                   self.__update_ui_failed
-        }
-
-    def __update_logs_ui(self, text, is_error, should_display):
-        if not should_display:
-            return
+        self.workflow.code_scanned.connect(self.__update_scanned_codes, Qt.DirectConnection)
+        self.workflow.serial_scanned.connect(self.__update_serial, Qt.DirectConnection)
+        self.workflow.state_changed.connect(self.__update_ui, Qt.DirectConnection)
+        self.workflow.test_state_changed.connect(self.__update_test_ui, Qt.DirectConnection)
 
+    @pyqtSlot(str, bool)
+    def __update_logs_ui(self, text, is_error):
         if not is_error:
-            self.ui.log_text_edit.append(f"[INFO] {text}")
+            self.pending_log_lines.append(f"[INFO] {text}")
         else:
-            self.ui.log_text_edit.append(f"[ERROR] {text}")
+            self.pending_log_lines.append(f"[ERROR] {text}")
+
+        # Coalesce bursts into one append so the widget re-lays out once
+        if not self.log_flush_scheduled:
+            self.log_flush_scheduled = True
+            QTimer.singleShot(16, self.__flush_logs_ui)
 
+    def __flush_logs_ui(self):
+        """Appends all buffered log lines to the log widget in one go"""
+        self.log_flush_scheduled = False
+        if not self.pending_log_lines:
+            return
+        # insertPlainText skips append()'s per-call block formatting;
+        # the whole batch lands as one document edit
+        self.pending_log_lines.append("")
+        self.ui.log_text_edit.moveCursor(QTextCursor.End)
+        self.ui.log_text_edit.insertPlainText("\n".join(self.pending_log_lines))
+        self.ui.log_text_edit.moveCursor(QTextCursor.End)
+        self.pending_log_lines.clear()
+
+    @pyqtSlot(list)
     def __update_scanned_codes(self, codes):
         """Updates UI with both scanned codes"""
         if len(codes) == 1:
@@ -97,6 +113,7 @@ class Main(QMainWindow):
         elif len(codes) == 2:
             self.ui.set_dm_qr_bottom(codes[1])
 
+    @pyqtSlot(str)
     def __update_serial(self, serial):
         """Updates UI for serial number"""
         self.ui.set_dm_qr_serial(serial)
@@ -105,14 +122,13 @@ class Main(QMainWindow):
         """Updates state for a given test"""
         self.ui.set_test_state(name, state)
 
-    def __update_ui(self, msgs):
+    def __update_ui(self, state, msgs):
         """Generic method to update UI on state change"""
-        state = self.workflow.state
         handler = self.state_handlers.get(state)
         if msgs:
-            handler(msgs)
+            handler(self, msgs)
         else:
-            handler()
+            handler(self)
 
     def __update_ui_idle(self):
         """Updates UI to reflect idle state"""
@@ -158,6 +174,21 @@ class Main(QMainWindow):
         """Updates UI to reflect failed state"""
         self.ui.update_status(msgs["status"], is_err=True)
 
+    # Built once at class level; handlers are looked up per state change
+    # and called with the instance explicitly
+    state_handlers = {
+        State.IDLE:                     __update_ui_idle,
+        State.STARTED:                  __update_ui_started,
+        State.CONNECTING_TO_UART:       __update_ui_connecting_to_uart,
+        State.SCANNING_SERIAL_NUM:      __update_ui_scanning_serial_num,
+        State.SCANNING_QR_CODES:        __update_ui_scanning_qr_codes,
+        State.REGISTERING_DEVICE:       __update_ui_register_device,
+        State.LOADING_UBOOT_VIA_JTAG:   __update_ui_loading_uboot_via_jtag,
+        State.WAITING_FOR_UBOOT:        __update_ui_waiting_for_uboot,
+        State.DONE:                     __update_ui_done,
+        State.FAILED:                   __update_ui_failed
+    }
+
     def keyPressEvent(self, event): # pylint: disable=invalid-name
         """Listens for key presses and forward them to workflow class"""
         self.workflow.key_pressed(event)
@@ -165,11 +196,13 @@ class Main(QMainWindow):
     def closeEvent(self, event): # pylint: disable=invalid-name
         """Handle window close event to ensure proper cleanup"""
         self.workflow.reset()
+        self.workflow.shutdown()
         event.accept()
 
 def main():
     """App entrypoint"""
     app = QApplication(sys.argv)
+    app.setStyleSheet(styles.APP_STYLESHEET)
 
     server_endpoint = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
     api_key = sys.argv[2] if len(sys.argv) > 2 else "FAKE-API-KEY"
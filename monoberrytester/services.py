@@ -6,24 +6,31 @@ TODO: replace with actual code when I get the barcode scanner
 """
 
 from queue import Queue
-from datetime import datetime
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
 
-import urllib
+import array
+import codecs
+import fcntl
+import time
+import urllib.parse
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
 from PyQt5.QtSerialPort import QSerialPort
-from PyQt5.QtCore import Qt, QObject, QProcess, pyqtSignal
+from PyQt5.QtCore import Qt, QObject, QProcess, pyqtSignal, pyqtSlot
 
 import texts
 
 class LoggingService(QObject):
     """Class for logging into a file and on screen to QTextEdit widget"""
 
-    logline_received = pyqtSignal(str, bool, bool) # text line, error, should_display
+    logline_received = pyqtSignal(str, bool) # text line, error
 
     def __init__(self):
         super().__init__()
+        self.listener = None
+        self.buffered_handler = None
         self.__init_logging()
 
     def reinit(self):
@@ -32,30 +39,55 @@ class LoggingService(QObject):
 
     def info(self, text, should_display=True):
         """Logs text as info"""
-        self.logline_received.emit(text, False, should_display)
+        # High-volume lines (UART mirror) skip the UI signal entirely
+        if should_display:
+            self.logline_received.emit(text, False)
         logging.info(text)
 
     def error(self, text, should_display=True):
         """Logs text as error"""
-        self.logline_received.emit(text, True, should_display)
+        if should_display:
+            self.logline_received.emit(text, True)
         logging.error(text)
 
     def __init_logging(self):
-        time_str = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+        time_str = time.strftime('%Y-%m-%d-%H-%M-%S')
         filename = f"/tmp/mbt-{time_str}.log"
 
         logger = logging.getLogger()
 
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+        if self.buffered_handler is not None:
+            self.buffered_handler.close() # flushes remaining records
+            self.buffered_handler = None
+
         for handler in logger.handlers[:]:
             handler.close()
             logger.removeHandler(handler)
 
-        handler = logging.FileHandler(filename)
+        file_handler = logging.FileHandler(filename)
         formatter = logging.Formatter('%(asctime)s - %(message)s')
-        handler.setFormatter(formatter)
-        handler.setLevel(logging.INFO)
-        logger.addHandler(handler)
+        file_handler.setFormatter(formatter)
+        file_handler.setLevel(logging.INFO)
+
+        # Batch disk writes: records hit the file every 64 entries, on
+        # any error, or when the handler is closed on reset
+        self.buffered_handler = MemoryHandler(
+            capacity=64,
+            flushLevel=logging.ERROR,
+            target=file_handler
+        )
+
+        # Log calls only enqueue the record; the listener thread owns the
+        # file handler so disk writes never stall the GUI thread
+        log_queue = Queue(-1)
+        logger.addHandler(QueueHandler(log_queue))
         logger.setLevel(logging.INFO)
+        self.listener = QueueListener(log_queue, self.buffered_handler)
+        self.listener.start()
 
 class ScannerService(QObject):
     """Class that handles communication with the USB barcode scanner
@@ -66,17 +98,19 @@ class ScannerService(QObject):
 
     code_received = pyqtSignal(str)
 
+    ENTER_KEYS = frozenset((Qt.Key_Return, Qt.Key_Enter))
+
     def __init__(self):
         super().__init__()
-        self.buffer = ""
+        self.buffer = []
 
     def handle_input(self, key, text):
         """Reads key presses until a return key is pressed"""
-        if key in (Qt.Key_Return, Qt.Key_Enter):
-            self.code_received.emit(self.buffer)
-            self.buffer = ""
+        if key in self.ENTER_KEYS:
+            self.code_received.emit("".join(self.buffer))
+            self.buffer.clear()
         elif text:
-            self.buffer += text
+            self.buffer.append(text)
 
 class ServerClient(QObject):
     # pylint: disable=line-too-long
@@ -99,11 +133,17 @@ class ServerClient(QObject):
         self.logger = logging_service
         self.server_endpoint = server_endpoint
         self.api_key = api_key
+        # One pooled session per client so repeated calls reuse the
+        # TCP connection (keep-alive) instead of reconnecting every time
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
         self.serial = None
         self.qr1 = None
         self.qr2 = None
         self.method = None
         self.path = None
+        self.url = None
         self.request_params = {}
 
     def set_params(self, serial, codes):
@@ -115,59 +155,83 @@ class ServerClient(QObject):
         self.qr2 = codes[1]
 
     def send_qrs(self):
-        self.__config_request("POST", f"/api/devices/{self.serial}/register?api_key={self.api_key}", {"qr1": self.qr1, "qr2": self.qr2})
+        path = f"/api/devices/{urllib.parse.quote(self.serial, safe='')}/register"
+        self.__config_request("POST", path, {"api_key": self.api_key, "qr1": self.qr1, "qr2": self.qr2})
 
     def run(self):
         """Runs the thread to registers device and MACs from our server"""
-        url = urllib.parse.urljoin(self.server_endpoint, self.path)
         try:
-            r = requests.request(
-                method=self.method.upper(),
-                url=url, params=self.request_params,
+            r = self.session.request(
+                method=self.method,
+                url=self.url, params=self.request_params,
                 timeout=10
             )
 
+            # Decode explicitly: r.text falls back to charset sniffing
+            # when the server omits the charset header
+            body = r.content.decode("utf-8", "replace")
+
             if r.status_code != 200:
-                self.response_received.emit(False, r.text)
+                self.response_received.emit(False, body)
             else:
-                self.response_received.emit(True, r.text)
+                self.response_received.emit(True, body)
         except requests.RequestException as e:
             self.error_occured.emit(str(e))
             self.logger.error(str(e))
 
     def __config_request(self, method: str, path: str, request_params: dict):
-        self.method = method
+        self.method = method.upper()
         self.path = path
+        # Resolved once here so run() does no URL work per (re)try
+        self.url = urllib.parse.urljoin(self.server_endpoint, path)
         self.request_params = request_params
 
 class SerialService(QObject):
     """Serial service to comminucate with the board via UART"""
 
+    # Linux serial ioctls to flip the tty into low latency mode
+    TIOCGSERIAL = 0x541E
+    TIOCSSERIAL = 0x541F
+    ASYNC_LOW_LATENCY = 0x2000
+
     connected = pyqtSignal()
     error_occurred = pyqtSignal(str)
     line_received = pyqtSignal(str)
 
+    # Internal signals so writes and the close happen on the service's
+    # own thread (QSerialPort is not thread-safe)
+    write_requested = pyqtSignal(bytes)
+    stop_requested = pyqtSignal()
+
     def __init__(self, port_name, baud_rate = 115200):
         super().__init__()
         self.port_name = port_name
         self.baud_rate = baud_rate
-        self.write_queue = Queue()
-        self.is_running = False
         self.serial_port = None
+        # Keeps state across chunks so multi-byte sequences split over
+        # two reads still decode correctly
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.write_requested.connect(self.__do_write)
+        self.stop_requested.connect(self.__do_stop)
 
     def stop(self):
         """Stop serial service"""
-        self.is_running = False
+        self.stop_requested.emit()
 
     def send(self, data: str):
-        """Send data via serial (writes to queue then the run loop sends it from queue)"""
-        if self.serial_port.isOpen():
-            self.write_queue.put(data)
+        """Send data via serial (queued onto the service thread)"""
+        if self.serial_port is not None and self.serial_port.isOpen():
+            # Encoded on the caller's thread so the I/O thread just writes
+            self.write_requested.emit(data.encode('utf-8'))
         else:
             self.error_occurred.emit(texts.LOG_ERROR_UART_WRITE_NOT_OPEN)
 
     def run(self):
-        """Runs a loop for reading and writing to serial"""
+        """Opens the port and hooks reads into the thread's event loop"""
+        if self.serial_port is not None and self.serial_port.isOpen():
+            self.serial_port.close()
+
+        self.decoder.reset()
         self.serial_port = QSerialPort()
         self.serial_port.setPortName(self.port_name)
         self.serial_port.setBaudRate(self.baud_rate)
@@ -176,21 +240,52 @@ class SerialService(QObject):
             self.error_occurred.emit(f"{texts.STATUS_CONN_TO_UART_FAILED} {self.serial_port.errorString()}")
             return
 
-        self.is_running = True
-        self.connected.emit()
+        self.__set_low_latency()
 
-        while self.is_running:
-            if self.serial_port.waitForReadyRead(10):
-                line = bytes(self.serial_port.readAll()).decode('utf-8', errors='ignore').strip()
-                if line:
-                    self.line_received.emit(str(line))
+        # No polling loop: the kernel wakes the event loop via readyRead
+        # whenever data arrives
+        self.serial_port.readyRead.connect(self.__on_ready_read)
 
-            while not self.write_queue.empty():
-                data = self.write_queue.get()
-                self.serial_port.write(data.encode('utf-8'))
-                self.serial_port.flush()
+        self.connected.emit()
 
-        self.serial_port.close()
+    @pyqtSlot()
+    def __on_ready_read(self):
+        """Handler draining available data when the port becomes readable.
+
+        Decodes once per drained chunk and splits into lines. Trailing
+        partial lines are emitted as-is rather than buffered, because
+        prompts we wait for (e.g. u-boot's autoboot countdown) arrive
+        without a newline."""
+        text = self.decoder.decode(self.serial_port.readAll().data())
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                self.line_received.emit(line)
+
+    @pyqtSlot(bytes)
+    def __do_write(self, data: bytes):
+        """Writes to the port on the service thread"""
+        self.serial_port.write(data)
+        self.serial_port.flush()
+
+    @pyqtSlot()
+    def __do_stop(self):
+        """Closes the port on the service thread"""
+        if self.serial_port is not None and self.serial_port.isOpen():
+            self.serial_port.close()
+
+    def __set_low_latency(self):
+        """Sets ASYNC_LOW_LATENCY on the tty so FTDI-class USB-serial
+        adapters deliver RX data after ~1 ms instead of the default
+        16 ms coalescing timer. Not supported on all ports (e.g. PTYs
+        used for development), so failures are silently ignored."""
+        try:
+            buf = array.array('i', [0] * 64)
+            fcntl.ioctl(self.serial_port.handle(), self.TIOCGSERIAL, buf)
+            buf[4] |= self.ASYNC_LOW_LATENCY
+            fcntl.ioctl(self.serial_port.handle(), self.TIOCSSERIAL, buf)
+        except (OSError, TypeError):
+            pass
 
 class SerialController(QObject):
     """Serial controller to make working with UART easier"""
@@ -215,20 +310,31 @@ class SerialController(QObject):
         """Adds a text to wait for and text to send after in the waiting_list"""
         self.waiting_list.append((wait_text, callback, send_text))
 
+    @pyqtSlot(str)
     def __on_line_received(self, line):
         """Handler for when data is received via serial"""
+        matched = []
+        still_waiting = []
         for wait_item in self.waiting_list:
-            wait_text, callback, send_text = None, None, None
+            if wait_item[0] in line:
+                matched.append(wait_item)
+            else:
+                still_waiting.append(wait_item)
+
+        # Swap the list before firing callbacks: removing while iterating
+        # skipped items and callbacks may register new waiters
+        self.waiting_list = still_waiting
+
+        for wait_item in matched:
+            callback, send_text = None, None
             if len(wait_item) == 2:
-                wait_text, callback = wait_item
+                _, callback = wait_item
             else:
-                wait_text, callback, send_text = wait_item
+                _, callback, send_text = wait_item
 
-            if wait_text in line:
-                self.waiting_list.remove(wait_item)
-                if send_text:
-                    self.serial_service.send(send_text)
-                callback()
+            if send_text:
+                self.serial_service.send(send_text)
+            callback()
 
 class ProcessService(QObject):
     """Service for running, reading from and writing to processes"""
@@ -242,6 +348,7 @@ class ProcessService(QObject):
         self.logger = logging_service
         self.process = QProcess()
         self.is_stopping = False
+        self.log_prefix = "ProcessService:"
         self.process.readyReadStandardOutput.connect(self.__handle_stdout)
         self.process.readyReadStandardError.connect(self.__handle_stderr)
         self.process.finished.connect(self.__handle_finished)
@@ -252,6 +359,8 @@ class ProcessService(QObject):
         if args is None:
             args = []
         self.is_stopping = False
+        # Built once; the output handlers log it on every chunk
+        self.log_prefix = f"ProcessService: {program} {' '.join(args)}"
         self.process.start(program, args)
 
     def stop(self):
@@ -272,28 +381,30 @@ class ProcessService(QObject):
         self.process.write(data)
         self.process.write(b"\n")
 
+    @pyqtSlot()
     def __handle_stdout(self):
         """Handler for receiving data via stdout"""
-        data = bytes(self.process.readAllStandardOutput())
-        self.logger.info(f"ProcessService: {self.process.program()} {' '.join(self.process.arguments())} received:\n{data}")
-        self.output_received.emit(data.decode("utf-8"))
+        text = self.process.readAllStandardOutput().data().decode("utf-8")
+        self.logger.info(f"{self.log_prefix} received:\n{text}")
+        self.output_received.emit(text)
 
+    @pyqtSlot()
     def __handle_stderr(self):
         """Handler for receiving data via stderr"""
-        data = bytes(self.process.readAllStandardError())
-        self.logger.error(f"ProcessService: {self.process.program()} {' '.join(self.process.arguments())} error:\n{data}")
-        self.error_received.emit(data.decode("utf-8"))
+        text = self.process.readAllStandardError().data().decode("utf-8")
+        self.logger.error(f"{self.log_prefix} error:\n{text}")
+        self.error_received.emit(text)
 
     def __handle_finished(self, exit_code, exit_status):
         """Handler for when process finishes"""
-        self.logger.info(f"ProcessService: {self.process.program()} {' '.join(self.process.arguments())} exited with {exit_code} {exit_status}")
+        self.logger.info(f"{self.log_prefix} exited with {exit_code} {exit_status}")
         self.process_finished.emit(exit_code)
 
     def __handle_error(self, error):
         """Handler for when process errors"""
         # Don't emit error if we're intentionally stopping the process
         if self.is_stopping and error == QProcess.Crashed:
-            self.logger.info(f"ProcessService: {self.process.program()} {' '.join(self.process.arguments())} stopped by user")
+            self.logger.info(f"{self.log_prefix} stopped by user")
             return
 
         error_messages = {
@@ -306,7 +417,7 @@ class ProcessService(QObject):
         }
 
         err_str = error_messages.get(error, "Unknown error")
-        self.logger.info(f"ProcessService: {self.process.program()} {' '.join(self.process.arguments())} error occured: {err_str}")
+        self.logger.info(f"{self.log_prefix} error occured: {err_str}")
         self.process_errored.emit(err_str)
 
 class ProcessController(QObject):
@@ -326,17 +437,28 @@ class ProcessController(QObject):
         """Adds a text to wait for and text to send after in the waiting_list"""
         self.waiting_list.append((wait_text, callback, send_text))
 
+    @pyqtSlot(str)
     def __on_output_received(self, output):
         """Handler for when output is received from process"""
+        matched = []
+        still_waiting = []
         for wait_item in self.waiting_list:
-            wait_text, callback, send_text = None, None, None
+            if wait_item[0] in output:
+                matched.append(wait_item)
+            else:
+                still_waiting.append(wait_item)
+
+        # Swap the list before firing callbacks: removing while iterating
+        # skipped items and callbacks may register new waiters
+        self.waiting_list = still_waiting
+
+        for wait_item in matched:
+            callback, send_text = None, None
             if len(wait_item) == 2:
-                wait_text, callback = wait_item
+                _, callback = wait_item
             else:
-                wait_text, callback, send_text = wait_item
+                _, callback, send_text = wait_item
 
-            if wait_text in output:
-                self.waiting_list.remove(wait_item)
-                if send_text:
-                    self.process_service.write_to_process(send_text)
-                callback()
\ No newline at end of file
+            if send_text:
+                self.process_service.write_to_process(send_text)
+            callback()
\ No newline at end of file
@@ -7,3 +7,12 @@ START_BTN           = "QPushButton { background-color: darkgreen; }"
 RESET_BTN           = "QPushButton { background-color: darkblue; }"
 STATUS_NORMAL       = "QLabel { font-size: 18px; color: white; }"
 STATUS_ERROR        = "QLabel { font-size: 18px; color: red; }"
+
+# Installed once on the QApplication; widgets switch appearance by
+# setting the matching dynamic property instead of per-call stylesheets
+APP_STYLESHEET = """
+QLabel[state="idle"]    { color: gray; }
+QLabel[state="running"] { color: yellow; }
+QLabel[state="success"] { color: green; }
+QLabel[state="failure"] { color: red; }
+"""
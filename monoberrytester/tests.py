@@ -2,16 +2,16 @@
 Test definitions for display and update on UI
 """
 
-from enum import Enum
+from enum import IntEnum, auto
 
-class TestKeys(Enum):
+class TestKeys(IntEnum):
     """Holds application states"""
-    CONN_TO_UART =          "conn_to_uart"
-    SCAN_SERIAL_NUM =       "scan_serial_num"
-    SCAN_TWO_DM_QR_CODES =  "scan_two_dm_qr_codes"
-    REGISTER_DEVICE =       "register_device"
-    LOAD_UBOOT_VIA_JTAG =   "load_uboot_via_jtag"
-    RECEIVE_UBOOT_PROMPT =  "receive_uboot_prompt"
+    CONN_TO_UART =          auto()
+    SCAN_SERIAL_NUM =       auto()
+    SCAN_TWO_DM_QR_CODES =  auto()
+    REGISTER_DEVICE =       auto()
+    LOAD_UBOOT_VIA_JTAG =   auto()
+    RECEIVE_UBOOT_PROMPT =  auto()
 
 TEST_DEFS = {
     TestKeys.CONN_TO_UART:           "Connect to UART",
@@ -8,7 +8,7 @@ from enum import Enum, auto
 
 from PyQt5.QtWidgets import (
     QHBoxLayout, QVBoxLayout, QGroupBox,
-    QWidget, QTextEdit, QLineEdit, QLabel, QPushButton
+    QWidget, QPlainTextEdit, QLineEdit, QLabel, QPushButton
 )
 
 import texts
@@ -28,6 +28,9 @@ class TestWidget(QWidget):
         description (str): Test description
     """
 
+    MARGINS = (8, 0, 8, 0)
+    SPACING = 16
+
     def __init__(self, description):
         super().__init__()
         self.indicator = QLabel("●")
@@ -35,28 +38,42 @@ class TestWidget(QWidget):
         self.label = QLabel(description)
 
         layout = QHBoxLayout(self)
-        layout.setContentsMargins(8, 0, 8, 0)
-        layout.setSpacing(16)
+        layout.setContentsMargins(*self.MARGINS)
+        layout.setSpacing(self.SPACING)
         layout.addWidget(self.indicator)
         layout.addWidget(self.label)
 
+        # Bound once so state changes dispatch without branching
+        self.setters = {
+            TestState.PENDING:      self.set_idle,
+            TestState.RUNNING:      self.set_running,
+            TestState.SUCCEEDED:    self.set_success,
+            TestState.FAILED:       self.set_failure
+        }
+
         self.set_idle()
 
     def set_idle(self):
         """Mark it as idle (gray color)"""
-        self.indicator.setStyleSheet("color: gray;")
+        self.__set_state("idle")
 
     def set_running(self):
         """Mark it as running (yellow color)"""
-        self.indicator.setStyleSheet("color: yellow;")
+        self.__set_state("running")
 
     def set_success(self):
         """Mark it as successful (green color)"""
-        self.indicator.setStyleSheet("color: green;")
+        self.__set_state("success")
 
     def set_failure(self):
         """Mark it as failed (red color)"""
-        self.indicator.setStyleSheet("color: red;")
+        self.__set_state("failure")
+
+    def __set_state(self, state: str):
+        """Flips the indicator to the matching APP_STYLESHEET rule"""
+        self.indicator.setProperty("state", state)
+        self.indicator.style().unpolish(self.indicator)
+        self.indicator.style().polish(self.indicator)
 
 class UI(QWidget):
     """Class capturing all UI logic and operations
@@ -71,6 +88,10 @@ class UI(QWidget):
         self.__init_ui()
 
     def __init_ui(self):
+        # Hold repaints while the widget tree is assembled so style
+        # polish and layout happen once at show time
+        self.setUpdatesEnabled(False)
+
         self.setContentsMargins(8, 8, 8, 8)
 
         layout = QHBoxLayout()
@@ -102,8 +123,14 @@ class UI(QWidget):
         self.dm_qr_group_layout.addWidget(self.dm_qr_line_edit_bottom)
         self.dm_qr_group.setLayout(self.dm_qr_group_layout)
 
-        self.log_text_edit = QTextEdit()
+        # QPlainTextEdit lays out per paragraph instead of maintaining a
+        # full rich-text document, which keeps appends cheap on the Pi
+        self.log_text_edit = QPlainTextEdit()
         self.log_text_edit.setDisabled(True)
+        # Ring-buffer the log: oldest blocks are evicted in O(1) so
+        # memory and per-append layout cost stay bounded on long shifts
+        self.log_text_edit.setMaximumBlockCount(5000)
+        self.log_text_edit.setUndoRedoEnabled(False)
 
         self.start_btn = QPushButton(texts.UI_START_BTN_LABEL_START)
         self.start_btn.setMinimumHeight(64)
@@ -128,6 +155,8 @@ class UI(QWidget):
         layout.addLayout(right_panel, stretch=2)
         self.setLayout(layout)
 
+        self.setUpdatesEnabled(True)
+
     def __init_tests_widgets(self, test_defs: dict) -> dict:
         """Create UI for tests"""
         test_widgets = {}
@@ -181,14 +210,7 @@ class UI(QWidget):
 
     def set_test_state(self, name, state):
         """Sets a state for a single test"""
-        if state is TestState.PENDING:
-            self.tests[name].set_idle()
-        elif state is TestState.RUNNING:
-            self.tests[name].set_running()
-        elif state is TestState.SUCCEEDED:
-            self.tests[name].set_success()
-        elif state is TestState.FAILED:
-            self.tests[name].set_failure()
+        self.tests[name].setters[state]()
 
     def mark_all_tests_idle(self):
         """Marks all tests as idle (on reset for example)"""
@@ -4,8 +4,8 @@
 All 'business' logic
 """
 
-from enum import Enum, auto
-from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from enum import IntEnum, auto
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
 
 import texts
 from ui import TestState
@@ -13,8 +13,12 @@ from tests import TestKeys
 
 from services import *
 
-class State(Enum):
-    """Class to define states of the application"""
+class State(IntEnum):
+    """Class to define states of the application
+
+    IntEnum so the per-key-event compares in key_pressed are plain
+    integer compares instead of Enum.__eq__ dispatch
+    """
     IDLE                        = auto()
     STARTED                     = auto()
     CONNECTING_TO_UART          = auto()
@@ -44,11 +48,15 @@ class Workflow(QObject):
         process_runner (ProcessService): Service managing running processes and reading and sending data to/from them
     """
 
-    state_changed = pyqtSignal(dict)
+    state_changed = pyqtSignal(object, object) # State, msgs dict or None
     serial_scanned = pyqtSignal(str)
     code_scanned = pyqtSignal(list)
     test_state_changed = pyqtSignal(TestKeys, TestState)
 
+    # Internal signals to run the workers on their threads
+    server_run_requested = pyqtSignal()
+    serial_open_requested = pyqtSignal()
+
     def __init__(
         self,
         logging_service: LoggingService,
@@ -77,13 +85,17 @@ class Workflow(QObject):
         self.process_controller = process_controller
 
         # Setup threads for services
+        # The server thread is started once and kept alive; each request
+        # is a queued invocation instead of a thread spin-up
         self.server_thread = QThread()
         self.server_client.moveToThread(self.server_thread)
-        self.server_thread.started.connect(self.server_client.run)
+        self.server_run_requested.connect(self.server_client.run)
+        self.server_thread.start()
 
         self.serial_thread = QThread()
         self.serial.moveToThread(self.serial_thread)
-        self.serial_thread.started.connect(self.serial.run)
+        self.serial_open_requested.connect(self.serial.run)
+        self.serial_thread.start()
 
         # Connect persistent logging handler
         self.serial.line_received.connect(self.__log_serial)
@@ -96,12 +108,18 @@ class Workflow(QObject):
         self.serial_num = None
         self.logger.reinit()
         self.serial.stop()
-        self.serial_thread.quit()
-        self.serial_thread.wait()
         self.process_runner.stop()
+        self.__disconnect_inflight_handlers()
 
         self.__change_state(State.IDLE)
 
+    def shutdown(self):
+        """Stops the worker threads (on application close)"""
+        self.server_thread.quit()
+        self.server_thread.wait()
+        self.serial_thread.quit()
+        self.serial_thread.wait()
+
     def start(self):
         """Entry point to start testing"""
         if self.state != State.IDLE:
@@ -113,183 +131,229 @@ class Workflow(QObject):
 
     def connect_to_uart(self):
         """Tests UART connection to the board"""
+        self.__advance(State.CONNECTING_TO_UART, next_test=TestKeys.CONN_TO_UART)
 
-        def handle_serial_connected():
-            """Called on successful serial connection"""
-            self.serial.connected.disconnect(handle_serial_connected)
-            self.serial.error_occurred.disconnect(handle_serial_error_occurred)
+        self.serial.connected.connect(self.__handle_serial_connected)
+        self.serial.error_occurred.connect(self.__handle_serial_error_occurred)
 
-            self.logger.info(texts.LOG_INFO_UART_CONNECTED)
-            self.scan_serial_num()
+        self.serial_open_requested.emit()
 
-        def handle_serial_error_occurred(err_msg):
-            """Called on failed serial connection"""
-            self.serial.connected.disconnect(handle_serial_connected)
-            self.serial.error_occurred.disconnect(handle_serial_error_occurred)
+    @pyqtSlot()
+    def __handle_serial_connected(self):
+        """Called on successful serial connection"""
+        self.serial.connected.disconnect(self.__handle_serial_connected)
+        self.serial.error_occurred.disconnect(self.__handle_serial_error_occurred)
 
-            self.logger.error(f"{texts.LOG_ERROR_UART_FAILED} {err_msg}")
-            self.__change_state(State.FAILED, {
-                "status": texts.STATUS_CONN_TO_UART_FAILED,
-                "err_msg": err_msg
-            })
-            self.test_state_changed.emit(TestKeys.CONN_TO_UART, TestState.FAILED)
+        self.logger.info(texts.LOG_INFO_UART_CONNECTED)
+        self.scan_serial_num()
 
-        self.__change_state(State.CONNECTING_TO_UART)
-        self.test_state_changed.emit(TestKeys.CONN_TO_UART, TestState.RUNNING)
+    @pyqtSlot(str)
+    def __handle_serial_error_occurred(self, err_msg):
+        """Called on failed serial connection"""
+        self.serial.connected.disconnect(self.__handle_serial_connected)
+        self.serial.error_occurred.disconnect(self.__handle_serial_error_occurred)
 
-        self.serial.connected.connect(handle_serial_connected)
-        self.serial.error_occurred.connect(handle_serial_error_occurred)
-
-        self.serial_thread.start()
+        self.logger.error(f"{texts.LOG_ERROR_UART_FAILED} {err_msg}")
+        self.__change_state(State.FAILED, {
+            "status": texts.STATUS_CONN_TO_UART_FAILED,
+            "err_msg": err_msg
+        })
+        self.test_state_changed.emit(TestKeys.CONN_TO_UART, TestState.FAILED)
 
     def scan_serial_num(self):
         """Prompts the user to scan the serial number"""
+        self.__advance(
+            State.SCANNING_SERIAL_NUM,
+            done_test=TestKeys.CONN_TO_UART,
+            next_test=TestKeys.SCAN_SERIAL_NUM
+        )
 
-        def handle_scanned_serial(code):
-            """Called upon successfully receiving serial number from scanner"""
-            self.scanner.code_received.disconnect(handle_scanned_serial)
+        self.scanner.code_received.connect(self.__handle_scanned_serial)
 
-            self.serial_num = code
-            self.serial_scanned.emit(self.serial_num)
-            self.scan_qr_codes()
+    @pyqtSlot(str)
+    def __handle_scanned_serial(self, code):
+        """Called upon successfully receiving serial number from scanner"""
+        self.scanner.code_received.disconnect(self.__handle_scanned_serial)
 
-        self.test_state_changed.emit(TestKeys.CONN_TO_UART, TestState.SUCCEEDED)
-        self.__change_state(State.SCANNING_SERIAL_NUM)
-        self.test_state_changed.emit(TestKeys.SCAN_SERIAL_NUM, TestState.RUNNING)
-
-        self.scanner.code_received.connect(handle_scanned_serial)
+        self.serial_num = code
+        self.serial_scanned.emit(self.serial_num)
+        self.scan_qr_codes()
 
     def scan_qr_codes(self):
         """Prompts user to scan two data matrix codes"""
+        self.__advance(
+            State.SCANNING_QR_CODES,
+            done_test=TestKeys.SCAN_SERIAL_NUM,
+            next_test=TestKeys.SCAN_TWO_DM_QR_CODES
+        )
 
-        def handle_scanned_qr(code):
-            """Called upon successfully receiving QR code from scanner"""
-            self.scanned_codes.append(code)
-            self.code_scanned.emit(self.scanned_codes)
-
-            if len(self.scanned_codes) == 1:
-                self.logger.info(f"{texts.LOG_INFO_FIRST_CODE_SCANNED} {code}")
-            elif len(self.scanned_codes) == 2:
-                self.scanner.code_received.disconnect(handle_scanned_qr)
+        self.scanner.code_received.connect(self.__handle_scanned_qr)
 
-                self.logger.info(f"{texts.LOG_INFO_SECOND_CODE_SCANNED} {code}")
-                self.register_device_and_get_macs()
-            else:
-                self.scanner.code_received.disconnect(handle_scanned_qr)
+    @pyqtSlot(str)
+    def __handle_scanned_qr(self, code):
+        """Called upon successfully receiving QR code from scanner"""
+        self.scanned_codes.append(code)
+        self.code_scanned.emit(self.scanned_codes)
 
-                self.logger.error(texts.LOG_ERROR_MORE_THAN_2_QR_SCANNED)
-                self.test_state_changed.emit(TestKeys.SCAN_TWO_DM_QR_CODES, TestState.FAILED)
+        if len(self.scanned_codes) == 1:
+            self.logger.info(f"{texts.LOG_INFO_FIRST_CODE_SCANNED} {code}")
+        elif len(self.scanned_codes) == 2:
+            self.scanner.code_received.disconnect(self.__handle_scanned_qr)
 
-        self.test_state_changed.emit(TestKeys.SCAN_SERIAL_NUM, TestState.SUCCEEDED)
-        self.__change_state(State.SCANNING_QR_CODES)
-        self.test_state_changed.emit(TestKeys.SCAN_TWO_DM_QR_CODES, TestState.RUNNING)
+            self.logger.info(f"{texts.LOG_INFO_SECOND_CODE_SCANNED} {code}")
+            self.register_device_and_get_macs()
+        else:
+            self.scanner.code_received.disconnect(self.__handle_scanned_qr)
 
-        self.scanner.code_received.connect(handle_scanned_qr)
+            self.logger.error(texts.LOG_ERROR_MORE_THAN_2_QR_SCANNED)
+            self.test_state_changed.emit(TestKeys.SCAN_TWO_DM_QR_CODES, TestState.FAILED)
 
     def register_device_and_get_macs(self):
         """Connect to our server to register device and get MAC addresses
         based on the serial and provided data matrix QR codes"""
+        self.__advance(
+            State.REGISTERING_DEVICE,
+            done_test=TestKeys.SCAN_TWO_DM_QR_CODES,
+            next_test=TestKeys.REGISTER_DEVICE
+        )
 
-        def handle_server_response(success: bool, response: str):
-            """Called upon receiving a response from the server"""
-            self.server_client.response_received.disconnect(handle_server_response)
-            self.server_client.error_occured.disconnect(handle_server_error)
-
-            self.server_thread.quit()
-            self.server_thread.wait()
-
-            if success:
-                self.logger.info(f"{texts.LOG_INFO_SERVER_RESPONSE} {response}")
-                r = response.split()
-                self.serial_num = r[0]
-                self.mac_addresses = r[1:]
-                self.load_uboot_via_jtag()
-            else:
-                self.logger.error(f"{texts.LOG_INFO_SERVER_ERROR} {response}")
-                self.test_state_changed.emit(TestKeys.REGISTER_DEVICE, TestState.FAILED)
-
-        def handle_server_error(err_msg):
-            """Called upon server connection error"""
-            self.server_client.response_received.disconnect(handle_server_response)
-            self.server_client.error_occured.disconnect(handle_server_error)
-
-            self.server_thread.quit()
-            self.server_thread.wait()
+        self.server_client.response_received.connect(self.__handle_server_response)
+        self.server_client.error_occured.connect(self.__handle_server_error)
 
+        self.server_client.set_params(self.serial_num, self.scanned_codes)
+        self.server_client.send_qrs()
+        self.server_run_requested.emit()
+
+    @pyqtSlot(bool, str)
+    def __handle_server_response(self, success: bool, response: str):
+        """Called upon receiving a response from the server"""
+        self.server_client.response_received.disconnect(self.__handle_server_response)
+        self.server_client.error_occured.disconnect(self.__handle_server_error)
+
+        if success:
+            self.logger.info(f"{texts.LOG_INFO_SERVER_RESPONSE} {response}")
+            # First line is the serial (may contain spaces), the rest
+            # are MAC addresses
+            serial_num, _, macs = response.partition("\n")
+            self.serial_num = serial_num.strip()
+            self.mac_addresses = macs.split()
+            self.load_uboot_via_jtag()
+        else:
+            self.logger.error(f"{texts.LOG_INFO_SERVER_ERROR} {response}")
             self.test_state_changed.emit(TestKeys.REGISTER_DEVICE, TestState.FAILED)
-            self.__change_state(State.FAILED, {
-                "status": texts.CONN_TO_SERVER_FAILED,
-                "err_msg": err_msg
-            })
 
-        self.test_state_changed.emit(TestKeys.SCAN_TWO_DM_QR_CODES, TestState.SUCCEEDED)
-        self.__change_state(State.REGISTERING_DEVICE)
-        self.test_state_changed.emit(TestKeys.REGISTER_DEVICE, TestState.RUNNING)
+    @pyqtSlot(str)
+    def __handle_server_error(self, err_msg):
+        """Called upon server connection error"""
+        self.server_client.response_received.disconnect(self.__handle_server_response)
+        self.server_client.error_occured.disconnect(self.__handle_server_error)
 
-        self.server_client.response_received.connect(handle_server_response)
-        self.server_client.error_occured.connect(handle_server_error)
-
-        self.server_client.set_params(self.serial_num, self.scanned_codes)
-        self.server_client.send_qrs()
-        if not self.server_thread.isRunning():
-            self.server_thread.start()
+        self.test_state_changed.emit(TestKeys.REGISTER_DEVICE, TestState.FAILED)
+        self.__change_state(State.FAILED, {
+            "status": texts.CONN_TO_SERVER_FAILED,
+            "err_msg": err_msg
+        })
 
     def load_uboot_via_jtag(self):
         """Init board and load U-Boot in memory via external program"""
-
-        def handle_process_output_received(text):
-            """Called when program outputs something to stdout"""
-            self.logger.info(text)
-
-        def handle_process_error_received(err_msg):
-            """Called when program outputs something to stderr"""
-            self.logger.error(err_msg)
-
-        def handle_process_errored(err_msg):
-            """Called when process errors out"""
-            self.logger.error(f"{texts.LOG_PROCESS_ERRORED} {err_msg}")
-            self.__change_state(State.FAILED, {
-                "status": texts.STATUS_PROCESS_ERRORED,
-                "err_msg": err_msg
-            })
-
-        def handle_process_finished(return_code):
-            """Called when process returns/exits"""
-            self.logger.info(f"{texts.LOG_PROCESS_EXITED} {return_code}")
-            if return_code == 0:
-                pass
-            else:
-                self.logger.error(texts.LOG_PROCESS_EXITED_NON_0_CODE)
-
-        def handle_exiting():
-            self.process_runner.stop()
-            self.wait_for_uboot()
-
-        self.test_state_changed.emit(TestKeys.REGISTER_DEVICE, TestState.SUCCEEDED)
-        self.__change_state(State.LOADING_UBOOT_VIA_JTAG)
-        self.test_state_changed.emit(TestKeys.LOAD_UBOOT_VIA_JTAG, TestState.RUNNING)
-
-        self.process_runner.output_received.connect(handle_process_output_received)
-        self.process_runner.error_received.connect(handle_process_error_received)
-        self.process_runner.process_errored.connect(handle_process_errored)
-        self.process_runner.process_finished.connect(handle_process_finished)
-
-        self.process_controller.wait_for("lsbp.tcl is exiting...", handle_exiting)
+        self.__advance(
+            State.LOADING_UBOOT_VIA_JTAG,
+            done_test=TestKeys.REGISTER_DEVICE,
+            next_test=TestKeys.LOAD_UBOOT_VIA_JTAG
+        )
+
+        self.process_runner.output_received.connect(self.__handle_process_output_received)
+        self.process_runner.error_received.connect(self.__handle_process_error_received)
+        self.process_runner.process_errored.connect(self.__handle_process_errored)
+        self.process_runner.process_finished.connect(self.__handle_process_finished)
+
+        self.process_controller.wait_for("lsbp.tcl is exiting...", self.__handle_process_exiting)
         self.process_runner.start("/home/rdme/CCS/bin/ccs", ["-nogfx", "-console", "-file", "/home/rdme/TAP/lsbp.tcl"])
 
+    @pyqtSlot(str)
+    def __handle_process_output_received(self, text):
+        """Called when program outputs something to stdout"""
+        self.logger.info(text)
+
+    @pyqtSlot(str)
+    def __handle_process_error_received(self, err_msg):
+        """Called when program outputs something to stderr"""
+        self.logger.error(err_msg)
+
+    @pyqtSlot(str)
+    def __handle_process_errored(self, err_msg):
+        """Called when process errors out"""
+        self.__disconnect_process_handlers()
+
+        self.logger.error(f"{texts.LOG_PROCESS_ERRORED} {err_msg}")
+        self.__change_state(State.FAILED, {
+            "status": texts.STATUS_PROCESS_ERRORED,
+            "err_msg": err_msg
+        })
+
+    @pyqtSlot(int)
+    def __handle_process_finished(self, return_code):
+        """Called when process returns/exits"""
+        self.logger.info(f"{texts.LOG_PROCESS_EXITED} {return_code}")
+        if return_code == 0:
+            pass
+        else:
+            self.logger.error(texts.LOG_PROCESS_EXITED_NON_0_CODE)
+
+    def __handle_process_exiting(self):
+        """Called when the JTAG loader script announces it is exiting"""
+        self.process_runner.stop()
+        self.__disconnect_process_handlers()
+        self.wait_for_uboot()
+
+    def __disconnect_process_handlers(self):
+        """Drops the per-run process_runner connections once the JTAG step
+        is over, so later emits (and retries after reset) don't stack up
+        duplicate handlers"""
+        for signal, handler in (
+            (self.process_runner.output_received, self.__handle_process_output_received),
+            (self.process_runner.error_received, self.__handle_process_error_received),
+            (self.process_runner.process_errored, self.__handle_process_errored),
+            (self.process_runner.process_finished, self.__handle_process_finished)
+        ):
+            try:
+                signal.disconnect(handler)
+            except TypeError:
+                pass # already disconnected
+
+    def __disconnect_inflight_handlers(self):
+        """Drops whichever one-shot handlers a mid-step reset left
+        connected; most will already be gone, which disconnect reports
+        with a TypeError we can ignore"""
+        for signal, handler in (
+            (self.serial.connected, self.__handle_serial_connected),
+            (self.serial.error_occurred, self.__handle_serial_error_occurred),
+            (self.scanner.code_received, self.__handle_scanned_serial),
+            (self.scanner.code_received, self.__handle_scanned_qr),
+            (self.server_client.response_received, self.__handle_server_response),
+            (self.server_client.error_occured, self.__handle_server_error)
+        ):
+            try:
+                signal.disconnect(handler)
+            except TypeError:
+                pass # already disconnected
+        self.__disconnect_process_handlers()
+
     def wait_for_uboot(self):
         """Wait for u-boot prompt"""
-        self.test_state_changed.emit(TestKeys.LOAD_UBOOT_VIA_JTAG, TestState.SUCCEEDED)
+        self.__advance(
+            State.WAITING_FOR_UBOOT,
+            done_test=TestKeys.LOAD_UBOOT_VIA_JTAG,
+            next_test=TestKeys.RECEIVE_UBOOT_PROMPT
+        )
         # self.serial_controller.wait_for("=>", self.done)
         # self.serial_controller.send("\r\n")
         self.serial_controller.wait_for_and_send("stop autoboot", "\r\n", self.done)
-        self.test_state_changed.emit(TestKeys.RECEIVE_UBOOT_PROMPT, TestState.RUNNING)
 
     def done(self):
         """Done, all tests have successfull passed and the board is
         fully functional (according to our knowledge)"""
-        self.test_state_changed.emit(TestKeys.RECEIVE_UBOOT_PROMPT, TestState.SUCCEEDED)
-        self.__change_state(State.DONE)
+        self.__advance(State.DONE, done_test=TestKeys.RECEIVE_UBOOT_PROMPT)
         self.logger.info(texts.LOG_INFO_DONE)
 
     def key_pressed(self, event):
@@ -298,13 +362,25 @@ class Workflow(QObject):
         if self.state in (State.SCANNING_QR_CODES, State.SCANNING_SERIAL_NUM):
             self.scanner.handle_input(event.key(), event.text())
 
+    def __advance(self, state, done_test=None, next_test=None):
+        """Helper capturing the step pattern shared by all transitions:
+        mark the finished test green, enter the new state, mark the next
+        test as running"""
+        if done_test is not None:
+            self.test_state_changed.emit(done_test, TestState.SUCCEEDED)
+        self.__change_state(state)
+        if next_test is not None:
+            self.test_state_changed.emit(next_test, TestState.RUNNING)
+
     def __change_state(self, state, msgs=None):
         """Helper to make sure state_changed is emited also on state change"""
-        if msgs is None:
-            msgs = {}
+        # Self-transitions without messages would only repaint the same UI
+        if state == self.state and msgs is None:
+            return
         self.state = state
-        self.state_changed.emit(msgs)
+        self.state_changed.emit(state, msgs)
 
+    @pyqtSlot(str)
     def __log_serial(self, data: str):
         """Persistent handler for logging all serial data"""
         self.logger.info(data, False)